@@ -1,14 +1,36 @@
 import requests
 import json
+import orjson
 import os
 import logging
-import csv
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+import io
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+from types import MappingProxyType
 import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _normalize_country_name(name: str) -> str:
+    """Forma canónica de un nombre de país: sin acentos, en minúsculas y sin espacios sobrantes."""
+    return unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower().strip()
+
+def _build_entity_lookup(name_map: Mapping[str, str], aliases: Mapping[str, Tuple[str, ...]]) -> Dict[str, str]:
+    """Construye el índice {nombre normalizado: código ISO3} con el nombre principal y sus variantes."""
+    lookup = {}
+    for code, name in name_map.items():
+        for variant in (name,) + aliases.get(code, ()):
+            lookup[_normalize_country_name(variant)] = code
+    return lookup
 
 class EudaimoniaPredictorGenerator:
     """
@@ -19,6 +41,10 @@ class EudaimoniaPredictorGenerator:
     """
     DATA_DIR = 'data'
     OUTPUT_FILE = os.path.join(DATA_DIR, 'data_indices_eudaimonia.json')
+    CACHE_DIR = os.path.join(DATA_DIR, '.cache')
+    
+    # Los CSV de CPI/GPI son anuales: una copia local de menos de 24 horas se considera válida.
+    HISTORICAL_CACHE_TTL = timedelta(hours=24)
     
     # URLs directas a los archivos CSV de GitHub, la fuente más fiable.
     # Nota: Los nombres de los datasets en GitHub pueden cambiar con cada actualización anual.
@@ -26,73 +52,181 @@ class EudaimoniaPredictorGenerator:
     CPI_URL = "https://raw.githubusercontent.com/owid/owid-datasets/master/datasets/Corruption%20Perception%20Index%20(Transparency%20International%2C%202024)/Corruption%20Perception%20Index%20(Transparency%20International%2C%202024).csv"
     GPI_URL = "https://raw.githubusercontent.com/owid/owid-datasets/master/datasets/Global%20Peace%20Index%20(IEP%2C%202024)/Global%20Peace%20Index%20(IEP%2C%202024).csv"
     
-    def __init__(self, country_codes: list):
+    # Nombre en inglés (OWID) de cada código ISO3. Es constante, así que se define una vez a nivel de clase.
+    COUNTRY_NAME_MAP: Mapping[str, str] = MappingProxyType({
+        'USA': 'United States', 'CHN': 'China', 'IND': 'India', 'BRA': 'Brazil',
+        'RUS': 'Russia', 'JPN': 'Japan', 'DEU': 'Germany', 'GBR': 'United Kingdom',
+        'CAN': 'Canada', 'FRA': 'France', 'ITA': 'Italy', 'AUS': 'Australia',
+        'MEX': 'Mexico', 'KOR': 'South Korea', 'SAU': 'Saudi Arabia', 'TUR': 'Turkey',
+        'EGY': 'Egypt', 'NGA': 'Nigeria', 'PAK': 'Pakistan', 'IDN': 'Indonesia',
+        'VNM': 'Vietnam', 'PHL': 'Philippines', 'ARG': 'Argentina', 'COL': 'Colombia',
+        'POL': 'Poland', 'ESP': 'Spain', 'IRN': 'Iran', 'ZAF': 'South Africa',
+        'UKR': 'Ukraine', 'THA': 'Thailand', 'VEN': 'Venezuela', 'CHL': 'Chile',
+        'PER': 'Peru', 'MYS': 'Malaysia', 'ROU': 'Romania', 'SWE': 'Sweden',
+        'BEL': 'Belgium', 'NLD': 'Netherlands', 'GRC': 'Greece', 'CZE': 'Czechia',
+        'PRT': 'Portugal', 'DNK': 'Denmark', 'FIN': 'Finland', 'NOR': 'Norway',
+        'SGP': 'Singapore', 'AUT': 'Austria', 'CHE': 'Switzerland', 'IRL': 'Ireland',
+        'NZL': 'New Zealand', 'HKG': 'Hong Kong', 'ISR': 'Israel', 'ARE': 'United Arab Emirates'
+    })
+    # Variantes con las que algunas fuentes publican el nombre de un país.
+    COUNTRY_NAME_ALIASES: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+        'USA': ('United States of America',),
+        'RUS': ('Russian Federation',),
+        'KOR': ('Korea, South', 'Republic of Korea', 'Korea, Rep.'),
+        'TUR': ('Türkiye',),
+        'EGY': ('Egypt, Arab Rep.',),
+        'VNM': ('Viet Nam',),
+        'IRN': ('Iran, Islamic Rep.',),
+        'VEN': ('Venezuela, Bolivarian Republic of', 'Venezuela, RB'),
+        'CZE': ('Czech Republic',),
+        'HKG': ('Hong Kong SAR, China',)
+    })
+    # Índice precalculado {nombre normalizado: código ISO3}: las filas de los CSV se asocian a su
+    # país con una sola búsqueda O(1), y las que no aparecen se descartan antes de agrupar.
+    ENTITY_TO_CODE: Mapping[str, str] = MappingProxyType(_build_entity_lookup(COUNTRY_NAME_MAP, COUNTRY_NAME_ALIASES))
+    
+    # Número de países procesados en paralelo (las llamadas son de red, no de CPU).
+    MAX_WORKERS = 16
+    # Tiempo máximo (conexión, lectura) en segundos para cada petición HTTP.
+    REQUEST_TIMEOUT = (5, 30)
+    
+    def __init__(self, country_codes: list, use_cache: bool = True):
         self.country_codes = country_codes
-        self.end_date = datetime.utcnow().date() - timedelta(days=2)
+        self.use_cache = use_cache
+        self.end_date = datetime.now(timezone.utc).date() - timedelta(days=2)
         self.start_date = self.end_date - timedelta(days=90)
+        # La fecha es constante durante toda la ejecución: se formatea una sola vez.
+        self.end_date_str = self.end_date.isoformat()
         self.media_cloud_api_url = "https://api.mediacloud.org/api/v2/sentences/"
         self.news_api_url = "https://newsapi.org/v2/everything"
-        self.country_name_map = {
-            'USA': 'United States', 'CHN': 'China', 'IND': 'India', 'BRA': 'Brazil',
-            'RUS': 'Russia', 'JPN': 'Japan', 'DEU': 'Germany', 'GBR': 'United Kingdom',
-            'CAN': 'Canada', 'FRA': 'France', 'ITA': 'Italy', 'AUS': 'Australia',
-            'MEX': 'Mexico', 'KOR': 'South Korea', 'SAU': 'Saudi Arabia', 'TUR': 'Turkey',
-            'EGY': 'Egypt', 'NGA': 'Nigeria', 'PAK': 'Pakistan', 'IDN': 'Indonesia',
-            'VNM': 'Vietnam', 'PHL': 'Philippines', 'ARG': 'Argentina', 'COL': 'Colombia',
-            'POL': 'Poland', 'ESP': 'Spain', 'IRN': 'Iran', 'ZAF': 'South Africa',
-            'UKR': 'Ukraine', 'THA': 'Thailand', 'VEN': 'Venezuela', 'CHL': 'Chile',
-            'PER': 'Peru', 'MYS': 'Malaysia', 'ROU': 'Romania', 'SWE': 'Sweden',
-            'BEL': 'Belgium', 'NLD': 'Netherlands', 'GRC': 'Greece', 'CZE': 'Czechia',
-            'PRT': 'Portugal', 'DNK': 'Denmark', 'FIN': 'Finland', 'NOR': 'Norway',
-            'SGP': 'Singapore', 'AUT': 'Austria', 'CHE': 'Switzerland', 'IRL': 'Ireland',
-            'NZL': 'New Zealand', 'HKG': 'Hong Kong', 'ISR': 'Israel', 'ARE': 'United Arab Emirates'
-        }
         self.historical_data_cache = {}
+        
+        # Sesión compartida para reutilizar conexiones (keep-alive) entre peticiones y hilos.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.MAX_WORKERS,
+            pool_maxsize=self.MAX_WORKERS,
+            # También se reintentan las respuestas de límite de peticiones y errores transitorios del servidor.
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _get_cached_text(self, url: str, ttl: timedelta) -> str:
+        """
+        Devuelve el contenido de `url`, usando una copia en disco si tiene menos de `ttl` de antigüedad.
+        Si la copia está vencida se revalida con una petición condicional (ETag / Last-Modified):
+        una respuesta 304 reutiliza la copia local sin volver a descargarla.
+        La clave de la caché es el SHA-1 de la URL.
+        """
+        cache_key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        cache_path = os.path.join(self.CACHE_DIR, cache_key + '.txt')
+        validators_path = os.path.join(self.CACHE_DIR, cache_key + '.meta.json')
+        has_cached_copy = self.use_cache and os.path.exists(cache_path)
+        
+        if has_cached_copy and time.time() - os.path.getmtime(cache_path) < ttl.total_seconds():
+            logger.info("📦 Usando copia en caché de %s", url)
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        
+        headers = {}
+        if has_cached_copy:
+            validators = self._load_cache_validators(validators_path)
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+        
+        response = self.session.get(url, headers=headers, timeout=self.REQUEST_TIMEOUT)
+        
+        if has_cached_copy and response.status_code == 304:
+            logger.info("📦 %s no ha cambiado, se reutiliza la copia en caché", url)
+            # Se renueva la fecha de la copia para que vuelva a ser válida durante `ttl`.
+            os.utime(cache_path)
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        
+        response.raise_for_status()
+        text = response.text
+        
+        if self.use_cache:
+            try:
+                os.makedirs(self.CACHE_DIR, exist_ok=True)
+                # Se escribe en un .tmp y se renombra: una ejecución interrumpida no deja un CSV
+                # truncado que luego se serviría como copia válida.
+                with open(cache_path + '.tmp', 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(cache_path + '.tmp', cache_path)
+                with open(validators_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump({
+                        'url': url,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified')
+                    }, f)
+                os.replace(validators_path + '.tmp', validators_path)
+            except OSError as e:
+                logger.warning("⚠️ No se pudo escribir la caché para %s: %s", url, e)
+        
+        return text
+
+    def _load_cache_validators(self, validators_path: str) -> Dict[str, Optional[str]]:
+        """Lee el ETag / Last-Modified guardados junto a una copia en caché."""
+        try:
+            with open(validators_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
 
     def _fetch_historical_data_from_csv(self, url: str, score_column: str, entity_column: str) -> Dict[str, Any]:
         """
         Fetch historical data from a CSV file via URL and return a dictionary of scores.
+        Successful results are kept in `historical_data_cache` for the lifetime of the instance.
         """
+        cache_key = (url, score_column, entity_column)
+        if cache_key in self.historical_data_cache:
+            return self.historical_data_cache[cache_key]
+        
         try:
-            logging.info(f"⏳ Fetching historical data from {url}...")
-            response = requests.get(url)
-            response.raise_for_status()
+            logger.info("⏳ Fetching historical data from %s...", url)
+            text = self._get_cached_text(url, self.HISTORICAL_CACHE_TTL)
             
-            data = {}
-            csv_reader = csv.reader(response.text.splitlines())
+            columns = [entity_column, 'Year', score_column]
+            df = pd.read_csv(io.StringIO(text), usecols=lambda column: column in columns)
             
-            headers = next(csv_reader)
-            
-            try:
-                score_idx = headers.index(score_column)
-                entity_idx = headers.index(entity_column)
-                year_idx = headers.index('Year')
-            except ValueError as e:
-                logging.error(f"❌ Column not found in CSV: {e}")
+            missing_columns = [column for column in columns if column not in df.columns]
+            if missing_columns:
+                logger.error("❌ Column not found in CSV: %s", missing_columns)
                 return {}
             
-            latest_data = {}
-            for row in csv_reader:
-                try:
-                    country_name = row[entity_idx].strip()
-                    year = int(float(row[year_idx]))
-                    score = float(row[score_idx])
-                    
-                    if country_name not in latest_data or year > latest_data[country_name]['year']:
-                        latest_data[country_name] = {'score': score, 'year': year}
-                except (ValueError, IndexError):
-                    continue
+            # Conversión numérica vectorizada: las filas con año o puntaje inválido se descartan.
+            df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+            df[score_column] = pd.to_numeric(df[score_column], errors='coerce')
+            df = df.dropna(subset=columns)
+            # Cada nombre distinto se normaliza una sola vez y se traduce a su código ISO3.
+            entity_codes = {
+                name: self.ENTITY_TO_CODE.get(_normalize_country_name(name))
+                for name in df[entity_column].astype(str).unique()
+            }
+            df['code'] = df[entity_column].astype(str).map(entity_codes)
+            df = df.dropna(subset=['code'])
             
-            for country_name, entry in latest_data.items():
-                data[country_name] = {'score': entry['score'], 'rank': None}
+            # Para cada país, la fila con el año más reciente.
+            latest = df.loc[df.groupby('code')['Year'].idxmax()]
+            data = {
+                code: {'score': float(score), 'rank': None}
+                for code, score in zip(latest['code'], latest[score_column])
+            }
 
-            logging.info(f"✅ Data fetched and processed for {len(data)} countries.")
+            logger.info("✅ Data fetched and processed for %d countries.", len(data))
+            # Solo se memorizan los resultados válidos: un fallo se reintenta en la próxima llamada.
+            if data:
+                self.historical_data_cache[cache_key] = data
             return data
         except requests.exceptions.RequestException as e:
-            logging.error(f"❌ Error fetching data from {url}: {e}")
+            logger.error("❌ Error fetching data from %s: %s", url, e)
             return {}
         except Exception as e:
-            logging.error(f"❌ Unexpected error processing data from {url}: {e}")
+            logger.error("❌ Unexpected error processing data from %s: %s", url, e)
             return {}
 
     def _fetch_historical_cpi(self) -> Dict[str, Any]:
@@ -116,7 +250,6 @@ class EudaimoniaPredictorGenerator:
         Returns a dictionary with 'corruption' and 'tension' scores, or None if data is not available.
         """
         if not media_cloud_key or not newsapi_key:
-            logging.error("❌ MEDIA_CLOUD_KEY o NEWSAPI_KEY no están configuradas. No se pueden obtener datos frescos.")
             return None
         
         # ⚠️ Aquí debes implementar la lógica específica para extraer y cuantificar
@@ -141,20 +274,11 @@ class EudaimoniaPredictorGenerator:
         # ya que los índices CPI/GPI tienen escalas definidas y los datos frescos son un placeholder.
         return all_data
 
-    def _calculate_eudaimonia_predictor(self, country_data: Dict[str, Any]) -> int:
+    def _get_predictor_inputs(self, country_data: Dict[str, Any]) -> Tuple[float, float, float, float]:
         """
-        Calcula el predictor de Eudaimonia basado en los índices de corrupción y tensión.
-        La Eudaimonia se relaciona con el deseo humano de amor, creación, aprendizaje y crecimiento[cite: 201].
-        La teoría implica que la represión de estas necesidades lleva al colapso[cite: 204, 205].
+        Extrae de un país los cuatro términos del predictor: corrupción y tensión históricas
+        (escaladas a 0-100) y los últimos valores frescos de corrupción y tensión.
         """
-        # ⚠️ La teoría no proporciona un algoritmo matemático para este cálculo.
-        # Una interpretación plausible es que la corrupción y la tensión disminuyen la Eudaimonia.
-        # El CPI (Índice de Percepción de la Corrupción) es de 0 a 100, donde 100 es muy limpio.
-        # Por lo tanto, un índice de corrupción del 0 al 100 podría ser (100 - CPI),
-        # donde 100 significa más corrupción y, por lo tanto, menos Eudaimonia.
-        # El GPI (Índice de Paz Global) es de 1 a 5, donde 5 es menos pacífico.
-        # Los datos frescos son un placeholder (0).
-        
         historical_corruption = country_data["historical"]["corruption_index"]
         historical_tension = country_data["historical"]["tension_index"]
         
@@ -166,92 +290,180 @@ class EudaimoniaPredictorGenerator:
         historical_corruption_scaled = historical_corruption if historical_corruption is not None else 0
         historical_tension_scaled = (historical_tension - 1) * 25 if historical_tension is not None else 0
         
-        # Obtenemos los datos frescos más recientes
-        latest_daily_data = list(country_data["daily_data"].values())
+        # Obtenemos los datos frescos más recientes (los dicts conservan el orden de inserción,
+        # así que el último valor se lee con reversed() sin copiar todo daily_data a una lista)
+        latest_daily_data = next(reversed(country_data["daily_data"].values()), None)
         if latest_daily_data:
-            fresh_corruption = latest_daily_data[-1].get("corruption_index", 0)
-            fresh_tension = latest_daily_data[-1].get("tension_index", 0)
+            fresh_corruption = latest_daily_data.get("corruption_index", 0)
+            fresh_tension = latest_daily_data.get("tension_index", 0)
         else:
             fresh_corruption = 0
             fresh_tension = 0
+        
+        return historical_corruption_scaled, historical_tension_scaled, fresh_corruption, fresh_tension
 
+    def _calculate_eudaimonia_predictors(self, results: Dict[str, Any], codes: List[str]):
+        """
+        Calcula el predictor de Eudaimonia basado en los índices de corrupción y tensión.
+        La Eudaimonia se relaciona con el deseo humano de amor, creación, aprendizaje y crecimiento[cite: 201].
+        La teoría implica que la represión de estas necesidades lleva al colapso[cite: 204, 205].
+        Se calcula para todos los `codes` a la vez con NumPy y se guarda en cada entrada de `results`.
+        """
+        # ⚠️ La teoría no proporciona un algoritmo matemático para este cálculo.
+        # Una interpretación plausible es que la corrupción y la tensión disminuyen la Eudaimonia.
+        # El CPI (Índice de Percepción de la Corrupción) es de 0 a 100, donde 100 es muy limpio.
+        # Por lo tanto, un índice de corrupción del 0 al 100 podría ser (100 - CPI),
+        # donde 100 significa más corrupción y, por lo tanto, menos Eudaimonia.
+        # El GPI (Índice de Paz Global) es de 1 a 5, donde 5 es menos pacífico.
+        # Los datos frescos son un placeholder (0).
+        if not codes:
+            return
+        
+        get_predictor_inputs = self._get_predictor_inputs
+        inputs = np.array([get_predictor_inputs(results[code]) for code in codes], dtype=np.float64)
+        historical_corruption, historical_tension, fresh_corruption, fresh_tension = inputs.T
+        
         # Propuesta de fórmula simple para el predictor (0-100).
         # Esto es una interpretación basada en el hecho de que la tensión y la corrupción
         # son fuerzas que van en contra de la Eudaimonia.
-        predictor = 100 - (historical_corruption_scaled * 0.5 + historical_tension_scaled * 0.5 + fresh_corruption * 0.2 + fresh_tension * 0.2)
+        predictor = 100 - (historical_corruption * 0.5 + historical_tension * 0.5 + fresh_corruption * 0.2 + fresh_tension * 0.2)
+        
+        # Asegurarse de que el predictor no sea negativo (truncado a entero, como int()).
+        predictor = np.maximum(0, np.trunc(predictor)).astype(np.int64)
+        
+        for code, value in zip(codes, predictor.tolist()):
+            results[code]["eudaimonia_predictor"] = value
+
+    def _process_country(self, code: str, country_data: Dict[str, Any], date_str: str, media_cloud_key: str, newsapi_key: str):
+        """
+        Obtiene los datos frescos de un país y actualiza su entrada diaria.
+        Cada llamada solo modifica el `country_data` recibido, por lo que es independiente del resto de países.
+        """
+        country_name = self.COUNTRY_NAME_MAP.get(code)
+        if not country_name:
+            return
         
-        # Asegurarse de que el predictor no sea negativo.
-        return max(0, int(predictor))
+        fresh_data = self._fetch_fresh_data(country_name, media_cloud_key, newsapi_key)
+        
+        country_data["daily_data"][date_str] = {
+            "corruption_index": fresh_data["corruption"] if fresh_data else 0,
+            "tension_index": fresh_data["tension"] if fresh_data else 0,
+            "data_available": fresh_data is not None
+        }
+
+    def _apply_historical_data(self, results: Dict[str, Any], historical_cpi: Dict[str, Any], historical_gpi: Dict[str, Any]):
+        """
+        Copia los puntajes CPI/GPI más recientes en la sección `historical` de cada país.
+        Ambos diccionarios están indexados por código ISO3.
+        """
+        # Referencias locales: evitan resolver los mismos atributos/métodos en cada iteración.
+        country_name_map = self.COUNTRY_NAME_MAP
+        get_cpi = historical_cpi.get
+        get_gpi = historical_gpi.get
+        
+        for code, country_data in results.items():
+            if code in country_name_map:
+                cpi_score = get_cpi(code, {}).get("score")
+                gpi_score = get_gpi(code, {}).get("score")
+                
+                if cpi_score is not None:
+                    country_data["historical"]["corruption_index"] = 100 - cpi_score
+                if gpi_score is not None:
+                    country_data["historical"]["tension_index"] = gpi_score
 
     def _load_existing_data(self) -> Dict[str, Any]:
-        if os.path.exists(self.OUTPUT_FILE):
-            with open(self.OUTPUT_FILE, 'r') as f:
-                return json.load(f)
-        return {}
+        # Se abre directamente en lugar de comprobar antes con os.path.exists (una llamada al sistema menos).
+        try:
+            with open(self.OUTPUT_FILE, 'rb') as f:
+                return orjson.loads(f.read())
+        except FileNotFoundError:
+            return {}
 
     def _save_data(self, data: Dict[str, Any]):
         try:
             os.makedirs(self.DATA_DIR, exist_ok=True)
-            with open(self.OUTPUT_FILE, 'w') as f:
-                json.dump(data, f, indent=2)
-            logging.info(f"✅ Archivo JSON guardado exitosamente en '{self.OUTPUT_FILE}'")
+            # orjson serializa directamente a bytes UTF-8 en C; mismo formato que json.dump(indent=2).
+            # Se escribe en un archivo temporal y se reemplaza de forma atómica, para que una
+            # ejecución interrumpida nunca deje el JSON a medio escribir.
+            tmp_file = self.OUTPUT_FILE + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_file, self.OUTPUT_FILE)
+            logger.info("✅ Archivo JSON guardado exitosamente en '%s'", self.OUTPUT_FILE)
         except Exception as e:
-            logging.error(f"❌ Error al guardar el archivo JSON: {e}")
+            logger.error("❌ Error al guardar el archivo JSON: %s", e)
 
     def generate_indices_json(self, media_cloud_key: str, newsapi_key: str):
         all_data = self._load_existing_data()
         
+        results = all_data.setdefault("results", {})
         for code in self.country_codes:
-            if code not in all_data.get("results", {}):
-                if "results" not in all_data:
-                    all_data["results"] = {}
-                all_data["results"][code] = {
+            if code not in results:
+                results[code] = {
                     "daily_data": {},
                     "historical": {"corruption_index": None, "tension_index": None},
                     "eudaimonia_predictor": 100,
                     "data_source": "Media Cloud/NewsAPI (fresh) + CPI/GPI (historical)"
                 }
         
-        if "metadata" not in all_data or not all_data["results"][self.country_codes[0]]["historical"]["corruption_index"]:
-            historical_cpi = self._fetch_historical_cpi()
-            historical_gpi = self._fetch_historical_gpi()
-            for code, country_data in all_data["results"].items():
-                country_name = self.country_name_map.get(code)
-                if country_name:
-                    cpi_score = historical_cpi.get(country_name, {}).get("score")
-                    gpi_score = historical_gpi.get(country_name, {}).get("score")
-                    
-                    if cpi_score is not None:
-                        country_data["historical"]["corruption_index"] = 100 - cpi_score
-                    if gpi_score is not None:
-                        country_data["historical"]["tension_index"] = gpi_score
+        # Los datos de CPI/GPI son anuales: solo se vuelven a descargar si aún no se obtuvieron este año
+        # (o si faltan en el archivo existente), de modo que las re-ejecuciones no repiten la descarga.
+        # Con la caché desactivada (NO_CACHE=1) se descargan siempre.
+        current_year = datetime.now(timezone.utc).year
+        historical_fetched_year = all_data.get("metadata", {}).get("historical_fetched_year")
+        needs_historical = (
+            not self.use_cache
+            or historical_fetched_year != current_year
+            or results[self.country_codes[0]]["historical"]["corruption_index"] is None
+        )
         
-        date_str = self.end_date.isoformat()
+        date_str = self.end_date_str
         
-        for code in self.country_codes:
-            country_name = self.country_name_map.get(code)
-            if not country_name:
-                continue
+        # La validación de las keys se hace una sola vez por ejecución, no por país.
+        if not media_cloud_key or not newsapi_key:
+            logger.error("❌ MEDIA_CLOUD_KEY o NEWSAPI_KEY no están configuradas. No se pueden obtener datos frescos.")
+        
+        codes_to_process = [code for code in self.country_codes if code in results and code in self.COUNTRY_NAME_MAP]
+        # Los países que ya tienen datos frescos para esta fecha (p. ej. al re-ejecutar el mismo día)
+        # no se vuelven a consultar; solo los demás pasan por la red.
+        codes_to_fetch = [
+            code for code in codes_to_process
+            if not results[code]["daily_data"].get(date_str, {}).get("data_available")
+        ]
+        
+        # CPI, GPI y los datos frescos no dependen entre sí: las descargas históricas se lanzan
+        # en segundo plano mientras se procesan los países, y solo se combinan al final.
+        with ThreadPoolExecutor(max_workers=2) as historical_executor:
+            if needs_historical:
+                cpi_future = historical_executor.submit(self._fetch_historical_cpi)
+                gpi_future = historical_executor.submit(self._fetch_historical_gpi)
             
-            fresh_data = self._fetch_fresh_data(country_name, media_cloud_key, newsapi_key)
+            # Las consultas de cada país son independientes: se lanzan en paralelo para
+            # solapar la latencia de red en lugar de sumarla.
+            with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+                list(executor.map(
+                    lambda code: self._process_country(code, results[code], date_str, media_cloud_key, newsapi_key),
+                    codes_to_fetch
+                ))
             
-            country_data = all_data["results"].get(code)
-            if country_data:
-                country_data["daily_data"][date_str] = {
-                    "corruption_index": fresh_data["corruption"] if fresh_data else 0,
-                    "tension_index": fresh_data["tension"] if fresh_data else 0,
-                    "data_available": fresh_data is not None
-                }
-                
-                country_data["eudaimonia_predictor"] = self._calculate_eudaimonia_predictor(country_data)
+            if needs_historical:
+                historical_cpi = cpi_future.result()
+                historical_gpi = gpi_future.result()
+                self._apply_historical_data(results, historical_cpi, historical_gpi)
+                if historical_cpi and historical_gpi:
+                    historical_fetched_year = current_year
+        
+        # El predictor se calcula de forma vectorizada una vez que todos los datos están disponibles.
+        self._calculate_eudaimonia_predictors(results, codes_to_process)
 
         all_data["metadata"] = {
             "purpose": "Predictors for Eudaimonia with historical context and fresh data",
-            "processing_date": datetime.utcnow().isoformat(),
-            "time_range_fresh": self.end_date.isoformat(),
+            "processing_date": datetime.now(timezone.utc).isoformat(),
+            "time_range_fresh": date_str,
             "time_range_historical": "2024 annual data",
-            "fresh_data_available": sum(1 for code in self.country_codes if all_data["results"].get(code, {}).get("daily_data", {}).get(date_str, {}).get("data_available")),
-            "countries_processed": len(all_data["results"])
+            "historical_fetched_year": historical_fetched_year,
+            "fresh_data_available": sum(1 for code in self.country_codes if results.get(code, {}).get("daily_data", {}).get(date_str, {}).get("data_available")),
+            "countries_processed": len(results)
         }
         
         self._save_data(all_data)
@@ -261,12 +473,14 @@ class EudaimoniaPredictorGenerator:
 def main():
     media_cloud_key = os.environ.get("MEDIA_CLOUD_KEY")
     newsapi_key = os.environ.get("NEWSAPI_KEY")
+    # NO_CACHE=1 fuerza la descarga de los datos históricos ignorando la caché local.
+    use_cache = os.environ.get("NO_CACHE", "").lower() not in ("1", "true", "yes")
     
     country_codes_str = os.environ.get("COUNTRIES_TO_PROCESS")
     if country_codes_str:
         country_list = country_codes_str.split(',')
     else:
-        logging.warning("⚠️ No se definió la variable COUNTRIES_TO_PROCESS. Usando la lista completa como fallback.")
+        logger.warning("⚠️ No se definió la variable COUNTRIES_TO_PROCESS. Usando la lista completa como fallback.")
         country_list = [
             'USA', 'CHN', 'IND', 'BRA', 'RUS', 'JPN', 'DEU', 'GBR', 'CAN', 'FRA',
             'ITA', 'AUS', 'MEX', 'KOR', 'SAU', 'TUR', 'EGY', 'NGA', 'PAK', 'IDN',
@@ -276,16 +490,18 @@ def main():
             'ISR', 'ARE'
         ]
     
-    generator = EudaimoniaPredictorGenerator(country_list)
+    generator = EudaimoniaPredictorGenerator(country_list, use_cache=use_cache)
     result = generator.generate_indices_json(
         media_cloud_key=media_cloud_key, 
         newsapi_key=newsapi_key
     )
     
-    countries_with_fresh_data = sum(1 for code, data in result['results'].items() if data['daily_data'].get((datetime.utcnow().date() - timedelta(days=2)).isoformat(), {}).get('data_available'))
+    # Se reutiliza la fecha de los datos frescos de la ejecución en lugar de recalcularla por país.
+    fresh_date_str = result['metadata']['time_range_fresh']
+    countries_with_fresh_data = sum(1 for code, data in result['results'].items() if data['daily_data'].get(fresh_date_str, {}).get('data_available'))
     countries_with_historical_data = sum(1 for code, data in result['results'].items() if data['historical'].get('corruption_index') is not None)
     
-    logging.info(f"Summary: {countries_with_fresh_data} countries processed with fresh data and {countries_with_historical_data} with historical data.")
+    logger.info("Summary: %d countries processed with fresh data and %d with historical data.", countries_with_fresh_data, countries_with_historical_data)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,11 +1,8 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import time
-from typing import Dict, List, Optional, Tuple
-import json
-from dataclasses import dataclass
+from typing import Dict, List, Optional
+import orjson
 import logging
 
 # Configuración de logging
@@ -13,6 +10,15 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 class CliodynamicDataProcessor:
     DATA_DIR = 'data'
+    # Ponderaciones del índice de inestabilidad de Turchin (constantes: se definen una sola vez)
+    TURCHIN_WEIGHTS = {
+        'youth_unemployment': 0.25,
+        'gini_coefficient': 0.25,
+        'elite_overproduction': 0.2,
+        'social_polarization': 0.15,
+        'institutional_distrust': 0.15,
+        'border_pressure': 0.1
+    }
 
     def __init__(self, cache_file: str = os.path.join('data', 'cache.json')):
         self.cache_file = cache_file
@@ -33,7 +39,7 @@ class CliodynamicDataProcessor:
             'KOR': ['South Korea', 'Republic of Korea', 'KR'],
             'SAU': ['Saudi Arabia', 'SA'],
             'TUR': ['Turkey', 'TR'],
-            'EGY': ['Egypt', 'EG'],
+            'EGY': ['Egypt', 'Egypt, Arab Rep.', 'EG'],
             'NGA': ['Nigeria', 'NG'],
             'PAK': ['Pakistan', 'PK'],
             'IDN': ['Indonesia', 'ID'],
@@ -68,8 +74,7 @@ class CliodynamicDataProcessor:
             'NZL': ['New Zealand', 'NZ'],
             'HKG': ['Hong Kong', 'HK'],
             'ISR': ['Israel', 'IL'],
-            'ARE': ['United Arab Emirates', 'AE'],
-            'EGY': ['Egypt, Arab Rep.', 'EG']
+            'ARE': ['United Arab Emirates', 'AE']
         }
         self.country_codes = list(self.gdelt_country_mapping.keys())
         self.indicators = {
@@ -203,14 +208,15 @@ class CliodynamicDataProcessor:
         """Carga datos de un archivo JSON."""
         try:
             full_path = os.path.join(self.DATA_DIR, file_path)
-            with open(full_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # orjson decodifica directamente los bytes UTF-8 del archivo.
+            with open(full_path, 'rb') as f:
+                data = orjson.loads(f.read())
             logging.info(f"Datos cargados exitosamente de {full_path}")
             return data
         except FileNotFoundError:
             logging.error(f"Error: El archivo {full_path} no fue encontrado.")
             return None
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logging.error(f"Error al decodificar JSON de {full_path}: {e}")
             return None
         except Exception as e:
@@ -240,16 +246,7 @@ class CliodynamicDataProcessor:
             'border_pressure': border_pressure
         }
         
-        # Ponderaciones
-        weights = {
-            'youth_unemployment': 0.25,
-            'gini_coefficient': 0.25,
-            'elite_overproduction': 0.2,
-            'social_polarization': 0.15,
-            'institutional_distrust': 0.15,
-            'border_pressure': 0.1
-        }
-        
+        weights = self.TURCHIN_WEIGHTS
         instability_score = sum(factors[key] * weights.get(key, 0) for key in factors)
         
         if instability_score > 0.4:
@@ -289,8 +286,8 @@ class CliodynamicDataProcessor:
     def save_to_json(self, data: List[Dict], filename: str = 'processed_data.json'):
         """Guarda los datos procesados en un archivo JSON."""
         file_path = os.path.join(self.DATA_DIR, filename)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with open(file_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
         logging.info(f"Datos guardados en {file_path}")
 
     def main(self):
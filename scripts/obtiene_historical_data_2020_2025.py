@@ -1,19 +1,26 @@
-import json
-import pandas as pd
+import hashlib
+import orjson
 from datetime import datetime
 import time
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import os
 import requests
 import logging
 import random
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests.exceptions import Timeout, RequestException
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class HistoricalDataGenerator:
+    # Espera máxima (segundos) que se acepta de una cabecera Retry-After.
+    MAX_RETRY_AFTER = 60
+    # Conexiones keep-alive que se conservan por host (cubre el número de hilos de descarga).
+    POOL_MAXSIZE = 16
+
     def __init__(self):
         # Usar TODOS los países de tu mapeo original
         self.country_codes = [
@@ -39,6 +46,24 @@ class HistoricalDataGenerator:
             'regulatory_quality': 'RQ.EST'
         }
         
+        # Fuente de cada indicador en la API del Banco Mundial (2 = WDI, 3 = Worldwide Governance
+        # Indicators). Los indicadores de una misma fuente se piden juntos en una sola petición.
+        self.world_bank_sources = {
+            'SI.POV.GINI': 2,
+            'SL.UEM.1524.ZS': 2,
+            'FP.CPI.TOTL.ZG': 2,
+            'SL.UEM.NEET.ZS': 2,
+            'SE.TER.ENRR': 2,
+            'GE.EST': 3,
+            'PV.EST': 3,
+            'CC.EST': 3,
+            'VA.EST': 3,
+            'RL.EST': 3,
+            'RQ.EST': 3
+        }
+        # Registros de la descarga agrupada, por (país, indicador); los que falten se piden uno a uno.
+        self._world_bank_bulk_items = {}
+        
         self.imf_indicators = {
             'inflation_annual': 'PCPI_A_SA_X_PCT',
             'gdp_per_capita': 'NGDPDPC_SA_XDC',
@@ -64,12 +89,41 @@ class HistoricalDataGenerator:
             'NGDP_RPCH': {'default': 2.0}
         }
 
-        self.max_retries = int(os.getenv('MAX_RETRIES', 5)) # Valor por defecto 3
+        # Las claves por defecto de los indicadores conocidos se resuelven una sola vez.
+        self._default_key_index = {
+            code: self._find_default_key(code)
+            for code in (*self.indicators.values(), *self.imf_indicators.values())
+        }
+
+        # Intentos por petición en fetch_with_retry (por defecto 3)
+        self.max_retries = int(os.getenv('MAX_RETRIES', 3))
         self.request_timeout = int(os.getenv('REQUEST_TIMEOUT', 90)) # Valor por defecto 30
 
+        # Caché en disco de las respuestas: los datos son anuales, así que una re-ejecución dentro
+        # del TTL no vuelve a consultar las APIs. NO_CACHE=1 fuerza la descarga.
+        self.cache_dir = os.path.join('data', '.cache')
+        self.cache_ttl_hours = int(os.getenv('CACHE_TTL_HOURS', 24))
+        self.use_cache = os.getenv('NO_CACHE', '').lower() not in ('1', 'true', 'yes')
+
+        # Sesión compartida: reutiliza la conexión TCP/TLS (keep-alive) entre las peticiones
+        # a api.worldbank.org e imf.org. Los reintentos los gestiona fetch_with_retry.
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': 'Mozilla/5.0'})
+        # El pool por defecto guarda 10 conexiones por host; con más hilos las sobrantes se cerrarían
+        # tras cada petición y habría que repetir el handshake TCP/TLS.
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.POOL_MAXSIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
 
     def get_default_key(self, indicator_code: str) -> Optional[str]:
         """Busca la clave de valor por defecto correcta para un código de indicador."""
+        if indicator_code in self._default_key_index:
+            return self._default_key_index[indicator_code]
+        return self._find_default_key(indicator_code)
+
+    def _find_default_key(self, indicator_code: str) -> Optional[str]:
+        """Prueba los sufijos de 1, 2 y 3 partes del código contra default_indicator_values."""
         parts = indicator_code.split('.')
         for i in range(1, 4):
             key = '.'.join(parts[-i:])
@@ -99,21 +153,87 @@ class HistoricalDataGenerator:
         except (ValueError, TypeError):
             return None
 
-    def fetch_with_retry(self, url: str, max_retries: int = 3, timeout: int = 90) -> Optional[dict]:
+    def _cache_path(self, url: str) -> str:
+        """Ruta del fichero de caché para una URL (SHA-1 de la URL)."""
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_cache(self, url: str) -> Optional[dict]:
+        """Devuelve la respuesta cacheada de `url` si existe y no ha vencido su TTL."""
+        if not self.use_cache:
+            return None
+        cache_path = self._cache_path(url)
+        try:
+            if time.time() - os.path.getmtime(cache_path) >= self.cache_ttl_hours * 3600:
+                return None
+            with open(cache_path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def _has_data(self, data) -> bool:
+        """
+        Indica si una respuesta trae datos y puede guardarse en caché. Las respuestas de error
+        del Banco Mundial ([{"message": [...]}]) o del FMI (sin "values") no se guardan, para
+        que un fallo temporal de la API no se repita durante todo el TTL.
+        """
+        if isinstance(data, list):
+            return len(data) >= 2 and not (isinstance(data[0], dict) and 'message' in data[0])
+        if isinstance(data, dict):
+            return bool(data.get('values'))
+        return False
+
+    def _write_cache(self, url: str, content: bytes):
+        """Guarda el cuerpo de una respuesta válida en la caché en disco."""
+        if not self.use_cache:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Se escribe en un .tmp y se renombra, igual que en eudaimonia_predictor.py:
+            # una ejecución interrumpida nunca deja un archivo a medias en la caché.
+            cache_path = self._cache_path(url)
+            with open(cache_path + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(cache_path + '.tmp', cache_path)
+        except OSError as e:
+            logging.warning(f"No se pudo escribir la caché para {url}: {e}")
+
+    def _retry_after_seconds(self, response: requests.Response) -> Optional[float]:
+        """Segundos indicados por la cabecera Retry-After (429/503), acotados a MAX_RETRY_AFTER."""
+        retry_after = response.headers.get('Retry-After')
+        if response.status_code not in (429, 503) or not retry_after:
+            return None
+        try:
+            return min(max(float(retry_after), 0.0), self.MAX_RETRY_AFTER)
+        except ValueError:
+            # Formato fecha HTTP u otro valor no numérico: se usa el backoff exponencial.
+            return None
+
+    def fetch_with_retry(self, url: str, max_retries: Optional[int] = None, timeout: int = 90) -> Optional[dict]:
         """Realiza una petición HTTP con reintentos y manejo de timeouts."""
-        headers = {'User-Agent': 'Mozilla/5.0'}
+        cached = self._read_cache(url)
+        if cached is not None:
+            logging.debug(f"Usando respuesta en caché para {url}")
+            return cached
+        
+        if max_retries is None:
+            max_retries = self.max_retries
         
         for attempt in range(max_retries):
+            retry_after = None
             try:                
-                response = requests.get(url, headers=headers, timeout=self.request_timeout)            
+                response = self.session.get(url, timeout=self.request_timeout)            
+                # Si la API limita la tasa de peticiones, se respeta la espera que indica.
+                retry_after = self._retry_after_seconds(response)
                 response.raise_for_status()
                 
                 # Verificar que la respuesta contiene datos válidos
                 if response.status_code == 200:
                     try:
-                        data = response.json()
+                        data = orjson.loads(response.content)
+                        if self._has_data(data):
+                            self._write_cache(url, response.content)
                         return data
-                    except json.JSONDecodeError:
+                    except orjson.JSONDecodeError:
                         logging.warning(f"Intento {attempt+1}: Respuesta JSON inválida de {url}")
                 else:
                     logging.warning(f"Intento {attempt+1}: Código de estado {response.status_code} de {url}")
@@ -125,9 +245,9 @@ class HistoricalDataGenerator:
             except Exception as e:
                 logging.warning(f"Intento {attempt+1}: Error inesperado con {url}: {e}")
             
-            # Esperar antes de reintentar (backoff exponencial)
+            # Esperar antes de reintentar (Retry-After del servidor o backoff exponencial)
             if attempt < max_retries - 1:
-                sleep_time = (2 ** attempt) + random.uniform(0, 1)
+                sleep_time = retry_after if retry_after is not None else (2 ** attempt) + random.uniform(0, 1)
                 time.sleep(sleep_time)
         
         logging.error(f"Todos los intentos fallaron para {url}")
@@ -138,17 +258,21 @@ class HistoricalDataGenerator:
         historical_data = {}
         indicator_name = next((k for k, v in self.indicators.items() if v == indicator_code), indicator_code)
         
-        # Construir URL para múltiples años
-        api_url = f"http://api.worldbank.org/v2/country/{country_code}/indicator/{indicator_code}?date={start_year}:{end_year}&format=json&per_page=100"
-        
-        data = self.fetch_with_retry(api_url)
-        if not data:
-            logging.warning(f"No se pudieron obtener datos del Banco Mundial para {country_code} - {indicator_code}")
-            return historical_data
+        # Si la descarga agrupada ya trajo este indicador, no se vuelve a consultar la API
+        bulk_items = self._world_bank_bulk_items.get((country_code, indicator_code))
+        if bulk_items is None:
+            # Construir URL para múltiples años
+            api_url = f"https://api.worldbank.org/v2/country/{country_code}/indicator/{indicator_code}?date={start_year}:{end_year}&format=json&per_page=100"
+            
+            data = self.fetch_with_retry(api_url)
+            if not data:
+                logging.warning(f"No se pudieron obtener datos del Banco Mundial para {country_code} - {indicator_code}")
+                return historical_data
         
         try:
-            if len(data) > 1 and data[1]:
-                for item in data[1]:
+            items = bulk_items if bulk_items is not None else (data[1] if len(data) > 1 and data[1] else [])
+            if items:
+                for item in items:
                     if item.get('value') is not None:
                         numeric_value = self.safe_numeric_conversion(item['value'])
                         if numeric_value is not None:
@@ -166,6 +290,61 @@ class HistoricalDataGenerator:
         
         return historical_data
 
+    def fetch_world_bank_bulk(self, country_code: str, indicator_codes: List[str], source_id: int, start_year: int, end_year: int) -> Optional[Dict[str, List[dict]]]:
+        """
+        Descarga en una sola petición varios indicadores de una misma fuente del Banco Mundial
+        y devuelve sus registros agrupados por código. Devuelve None si la respuesta no es
+        utilizable, para que cada indicador se pida por separado.
+        """
+        api_url = (
+            f"https://api.worldbank.org/v2/country/{country_code}/indicator/{';'.join(indicator_codes)}"
+            f"?source={source_id}&date={start_year}:{end_year}&format=json&per_page=1000"
+        )
+        
+        data = self.fetch_with_retry(api_url)
+        # Una respuesta de error es una lista con un único mensaje; si hubiera más de una página
+        # faltarían registros, así que también se descarta.
+        if not isinstance(data, list) or len(data) < 2 or not isinstance(data[0], dict) or data[0].get('pages', 1) > 1:
+            logging.warning(f"Descarga agrupada no disponible para {country_code} (fuente {source_id}); se pedirá cada indicador por separado")
+            return None
+        
+        grouped = {code: [] for code in indicator_codes}
+        for item in data[1] or []:
+            code = (item.get('indicator') or {}).get('id')
+            if code in grouped:
+                grouped[code].append(item)
+        return grouped
+
+    def _prefetch_world_bank_bulk(self, start_year: int, end_year: int, max_workers: int):
+        """
+        Pide todos los indicadores de cada fuente de un país en una sola petición, en lugar de
+        una por indicador. Los indicadores sin fuente conocida o cuya descarga agrupada falle
+        se siguen pidiendo uno a uno en fetch_world_bank_historical.
+        """
+        self._world_bank_bulk_items = {}
+        codes_by_source = {}
+        for indicator_code in self.indicators.values():
+            source_id = self.world_bank_sources.get(indicator_code)
+            if source_id is not None:
+                codes_by_source.setdefault(source_id, []).append(indicator_code)
+        
+        tasks = [
+            (country, indicator_codes, source_id)
+            for country in self.country_codes
+            for source_id, indicator_codes in codes_by_source.items()
+        ]
+        logging.info(f"Descarga agrupada del Banco Mundial: {len(tasks)} peticiones")
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda task: self.fetch_world_bank_bulk(task[0], task[1], task[2], start_year, end_year),
+                tasks
+            )
+            for (country, indicator_codes, _), grouped in zip(tasks, results):
+                if grouped is not None:
+                    for indicator_code in indicator_codes:
+                        self._world_bank_bulk_items[(country, indicator_code)] = grouped[indicator_code]
+
     def fetch_imf_historical(self, country_code: str, indicator_code: str, start_year: int, end_year: int) -> Dict:
         """Fetch historical IMF data for multiple years with robust error handling"""
         historical_data = {}
@@ -197,6 +376,41 @@ class HistoricalDataGenerator:
         
         return historical_data
 
+    def _fetch_indicator(self, country: str, indicator_name: str, indicator_code: str, fetch_fn: Callable[[str, str, int, int], Dict], start_year: int, end_year: int) -> Dict:
+        """Obtiene un indicador de un país, usando el valor por defecto si no hay datos."""
+        try:
+            data = fetch_fn(country, indicator_code, start_year, end_year)
+            if data:
+                logging.info(f"✓ {country} - {indicator_name} ({len(data)} puntos de datos)")
+                return data
+            logging.warning(f"✗ {country} - {indicator_name} (sin datos)")
+        except Exception as e:
+            logging.error(f"Error procesando {country} - {indicator_name}: {e}")
+        # Añadir valor por defecto para el año actual (sin datos o en caso de error)
+        return {end_year: self.get_default_value(indicator_code, country)}
+
+    def _fetch_all(self, target: Dict, indicators: Dict[str, str], fetch_fn: Callable[[str, str, int, int], Dict], start_year: int, end_year: int, max_workers: int):
+        """
+        Descarga todos los pares (país, indicador) con un único pool de `max_workers` hilos.
+        Cada hilo toma la siguiente petición en cuanto termina la anterior: no hay lotes que
+        esperen al país más lento ni pausas fijas entre ellos, y la concurrencia sigue acotada.
+        """
+        tasks = [
+            (country, indicator_name, indicator_code)
+            for country in self.country_codes
+            for indicator_name, indicator_code in indicators.items()
+        ]
+        logging.info(f"Descargando {len(tasks)} series con {max_workers} peticiones simultáneas")
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(
+                lambda task: self._fetch_indicator(*task, fetch_fn, start_year, end_year),
+                tasks
+            )
+            # executor.map conserva el orden de las tareas, así que el JSON mantiene el mismo orden.
+            for (country, indicator_name, _), data in zip(tasks, results):
+                target.setdefault(country, {})[indicator_name] = data
+
     def generate_historical_dataset(self, batch_size: int = 5):
         """Generate historical dataset for the last 5 years with comprehensive error handling"""
         current_year = 2025
@@ -214,74 +428,24 @@ class HistoricalDataGenerator:
             'imf': {}
         }
         
-        # Procesar en lotes para evitar sobrecargar las APIs
+        # batch_size limita el número de peticiones simultáneas para no sobrecargar las APIs
         total_countries = len(self.country_codes)
         
-        # Fetch World Bank data por lotes
-        logging.info(f"Fetching World Bank historical data for {total_countries} countries in batches...")
-        for batch_start in range(0, total_countries, batch_size):
-            batch_end = min(batch_start + batch_size, total_countries)
-            batch_countries = self.country_codes[batch_start:batch_end]
-            
-            logging.info(f"Processing batch {batch_start//batch_size + 1}/{(total_countries + batch_size - 1)//batch_size}: {batch_countries}")
-            
-            for country in batch_countries:
-                historical_data['world_bank'][country] = {}
-                for indicator_name, indicator_code in self.indicators.items():
-                    try:
-                        data = self.fetch_world_bank_historical(country, indicator_code, start_year, current_year)
-                        if data:
-                            historical_data['world_bank'][country][indicator_name] = data
-                            logging.info(f"✓ {country} - {indicator_name} ({len(data)} puntos de datos)")
-                        else:
-                            logging.warning(f"✗ {country} - {indicator_name} (sin datos)")
-                            # Añadir valor por defecto para el año actual
-                            default_value = self.get_default_value(indicator_code, country)
-                            historical_data['world_bank'][country][indicator_name] = {current_year: default_value}
-                    except Exception as e:
-                        logging.error(f"Error procesando {country} - {indicator_name}: {e}")
-                        # Añadir valor por defecto en caso de error
-                        default_value = self.get_default_value(indicator_code, country)
-                        historical_data['world_bank'][country][indicator_name] = {current_year: default_value}
-            
-            # Pequeña pausa entre lotes
-            time.sleep(2)
+        # Fetch World Bank data
+        logging.info(f"Fetching World Bank historical data for {total_countries} countries...")
+        self._prefetch_world_bank_bulk(start_year, current_year, batch_size)
+        self._fetch_all(historical_data['world_bank'], self.indicators, self.fetch_world_bank_historical, start_year, current_year, batch_size)
         
-        # Fetch IMF data por lotes
-        logging.info(f"Fetching IMF historical data for {total_countries} countries in batches...")
-        for batch_start in range(0, total_countries, batch_size):
-            batch_end = min(batch_start + batch_size, total_countries)
-            batch_countries = self.country_codes[batch_start:batch_end]
-            
-            logging.info(f"Processing batch {batch_start//batch_size + 1}/{(total_countries + batch_size - 1)//batch_size}: {batch_countries}")
-            
-            for country in batch_countries:
-                historical_data['imf'][country] = {}
-                for indicator_name, indicator_code in self.imf_indicators.items():
-                    try:
-                        data = self.fetch_imf_historical(country, indicator_code, start_year, current_year)
-                        if data:
-                            historical_data['imf'][country][indicator_name] = data
-                            logging.info(f"✓ {country} - {indicator_name} ({len(data)} puntos de datos)")
-                        else:
-                            logging.warning(f"✗ {country} - {indicator_name} (sin datos)")
-                            # Añadir valor por defecto para el año actual
-                            default_value = self.get_default_value(indicator_code, country)
-                            historical_data['imf'][country][indicator_name] = {current_year: default_value}
-                    except Exception as e:
-                        logging.error(f"Error procesando {country} - {indicator_name}: {e}")
-                        # Añadir valor por defecto en caso de error
-                        default_value = self.get_default_value(indicator_code, country)
-                        historical_data['imf'][country][indicator_name] = {current_year: default_value}
-            
-            # Pequeña pausa entre lotes
-            time.sleep(2)
+        # Fetch IMF data
+        logging.info(f"Fetching IMF historical data for {total_countries} countries...")
+        self._fetch_all(historical_data['imf'], self.imf_indicators, self.fetch_imf_historical, start_year, current_year, batch_size)
         
         # Save to file
         os.makedirs('data', exist_ok=True)
         try:
-            with open('data/historical_data_2020_2025.json', 'w') as f:
-                json.dump(historical_data, f, indent=2)
+            # Los años son claves int: OPT_NON_STR_KEYS los escribe como texto, igual que json.dump.
+            with open('data/historical_data_2020_2025.json', 'wb') as f:
+                f.write(orjson.dumps(historical_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
             logging.info(f"Historical data saved to data/historical_data_2020_2025.json")
             logging.info(f"Total countries processed: {total_countries}")
         except Exception as e:
@@ -291,4 +455,4 @@ class HistoricalDataGenerator:
 
 if __name__ == "__main__":
     generator = HistoricalDataGenerator()
-    generator.generate_historical_dataset(batch_size=5)  # Tamaño de lote reducido para evitar timeouts
+    generator.generate_historical_dataset(batch_size=5)  # Pocas peticiones simultáneas para evitar timeouts
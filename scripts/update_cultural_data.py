@@ -1,17 +1,15 @@
 import json
+import orjson
 import requests
 from datetime import datetime, timedelta
 import logging
 import os
 import pandas as pd
 import numpy as np
-from bs4 import BeautifulSoup
-import time
 import re
-import hashlib
 import backoff
 from requests.exceptions import Timeout, RequestException, HTTPError, ConnectionError
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any
 import urllib3
 from urllib3.exceptions import InsecureRequestWarning
 
@@ -30,6 +28,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class WVSCulturalDataUpdater:
+    # Patrones (en minúsculas) que indican actualizaciones en el portal del WVS
+    WVS_UPDATE_INDICATORS = (
+        'wave 8', 'wave 9', '2023', '2024', '2025',
+        'new release', 'data update', 'latest wave',
+        'new data', 'recent update'
+    )
+    # Una sola expresión regular con todas las alternativas: el texto se recorre una vez
+    # en lugar de una búsqueda por cada patrón.
+    WVS_UPDATE_PATTERN = re.compile('|'.join(map(re.escape, WVS_UPDATE_INDICATORS)))
+    
     def __init__(self, data_file='data/data_worldsurvey_valores.json'):
         self.data_file = data_file
         self.wvs_base_url = "https://www.worldvaluessurvey.org"
@@ -41,6 +49,17 @@ class WVSCulturalDataUpdater:
         self.max_retries = 5
         self.retry_backoff = 2
         
+        # Sesión compartida para reutilizar conexiones (keep-alive); los reintentos los hace backoff.
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+        })
+        
         # Lista completa de todos los países
         self.all_countries = [
             'USA', 'CHN', 'IND', 'BRA', 'RUS', 'JPN', 'DEU', 'GBR', 'CAN', 'FRA',
@@ -115,20 +134,11 @@ class WVSCulturalDataUpdater:
         Realiza una petición HTTP con reintentos exponenciales.
         """
         timeout = timeout or self.timeout
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
         
         try:
             logger.info(f"🌐 Solicitando URL: {url}")
-            response = requests.get(
+            response = self.session.get(
                 url, 
-                headers=headers, 
                 timeout=timeout,
                 verify=False,
                 allow_redirects=True
@@ -183,17 +193,13 @@ class WVSCulturalDataUpdater:
                 logger.warning("❌ No se pudo conectar al WVS para verificar actualizaciones")
                 return False
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            text_content = soup.get_text().lower()
-            
-            # Patrones que indican actualizaciones
-            update_indicators = [
-                'wave 8', 'wave 9', '2023', '2024', '2025',
-                'new release', 'data update', 'latest wave',
-                'new data', 'recent update'
-            ]
+            # lxml solo se necesita aquí: se importa bajo demanda para no cargarlo en cada ejecución.
+            # Construye el árbol en C y extrae todo el texto en una sola llamada.
+            import lxml.html
+            tree = lxml.html.fromstring(response.content)
+            text_content = tree.text_content().lower()
             
-            has_update = any(indicator in text_content for indicator in update_indicators)
+            has_update = self.WVS_UPDATE_PATTERN.search(text_content) is not None
             
             # Verificar por fecha de última actualización
             if self.current_data:
@@ -397,15 +403,16 @@ class WVSCulturalDataUpdater:
             # Obtener datos académicos
             academic_data = self.get_academic_cultural_data()
             
-            # Preparar metadatos
+            # Preparar metadatos (un único instante para que todas las fechas sean coherentes)
+            now = datetime.now()
             metadata = {
                 "source": "Datos académicos de referencia basados en World Values Survey",
-                "processing_date": datetime.now().strftime('%Y-%m-%d'),
-                "last_updated": datetime.now().isoformat(),
+                "processing_date": now.strftime('%Y-%m-%d'),
+                "last_updated": now.isoformat(),
                 "version": "2.1",
                 "update_frequency": "monthly",
                 "data_points": len(academic_data),
-                "next_scheduled_update": (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'),
+                "next_scheduled_update": (now + timedelta(days=30)).strftime('%Y-%m-%d'),
                 "countries_covered": len(academic_data),
                 "update_type": "academic_reference",
                 "wvs_data_available": False,
@@ -420,8 +427,8 @@ class WVSCulturalDataUpdater:
             
             # Guardar datos
             os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(final_data, f, indent=2, ensure_ascii=False)
+            with open(self.data_file, 'wb') as f:
+                f.write(orjson.dumps(final_data, option=orjson.OPT_INDENT_2))
                 
             logger.info(f"💾 Datos guardados en: {self.data_file}")
             logger.info(f"🌍 Total países: {len(academic_data)}")